@@ -4,11 +4,18 @@ A Flask web application with AI-assisted features.
 """
 
 import sqlite3
+import json
 import re
+import bisect
+import random
 import calendar
+from collections import namedtuple
 from datetime import datetime, date, timedelta
 from functools import wraps
-from flask import Flask, render_template, request, redirect, url_for, flash, jsonify
+from itertools import chain, groupby
+from operator import itemgetter
+from flask import (Flask, render_template, request, redirect, url_for, flash, g,
+                   Response, stream_with_context, get_flashed_messages)
 from faker import Faker
 
 app = Flask(__name__)
@@ -17,102 +24,262 @@ fake = Faker()
 
 DATABASE = 'attendance.db'
 
+# Hot statements are kept as single constants so every call hits the same
+# entry in the connection's prepared-statement cache
+_STUDENTS_SQL = 'SELECT * FROM students ORDER BY roll_no'
+_INSERT_STUDENT_SQL = 'INSERT INTO students (roll_no, name, semester) VALUES (?, ?, ?)'
+_INSERT_ATTENDANCE_SQL = 'INSERT INTO attendance_records (date, student_id, status) VALUES (?, ?, ?)'
+
+# Lightweight per-student rows handed to templates
+AttendanceRow = namedtuple(
+    'AttendanceRow', 'id roll_no name attendance_pct attendance_remark remark_class'
+)
+MarksRow = namedtuple('MarksRow', 'id roll_no name marks remark')
+
+_ROLL_RE = re.compile(r'^[A-Za-z0-9\-]{3,15}\Z')
+
+# Remark buckets: thresholds are lower bounds, labels[i] covers thresholds[i-1] <= x < thresholds[i]
+_ATT_THRESHOLDS = (60, 75, 90)
+_ATT_LABELS = (
+    ("Critical: Below 60% - Immediate attention needed", "danger"),
+    ("Warning: Below 75% - May affect eligibility", "warning"),
+    ("Good - Meets requirement", "info"),
+    ("Excellent", "success"),
+)
+_PERF_THRESHOLDS = (40, 60, 70, 80, 90)
+_PERF_LABELS = (
+    "Poor - Requires Support",
+    "Needs Improvement",
+    "Average",
+    "Good",
+    "Very Good",
+    "Excellent",
+)
+
+# Thresholds are whole numbers, so each whole score 0-100 maps to one label;
+# building the tables at import turns classification into a tuple index
+_ATT_BY_SCORE = tuple(_ATT_LABELS[bisect.bisect_right(_ATT_THRESHOLDS, p)] for p in range(101))
+_PERF_BY_SCORE = tuple(_PERF_LABELS[bisect.bisect_right(_PERF_THRESHOLDS, m)] for m in range(101))
+
 
 def get_db():
     """Get database connection."""
-    conn = sqlite3.connect(DATABASE)
+    conn = sqlite3.connect(DATABASE, cached_statements=256)
     conn.row_factory = sqlite3.Row
+    # Per-connection settings; WAL makes synchronous=NORMAL safe against corruption
+    conn.executescript("""
+        PRAGMA foreign_keys = ON;
+        PRAGMA synchronous = NORMAL;
+        PRAGMA temp_store = MEMORY;
+        PRAGMA cache_size = -20000;
+        PRAGMA mmap_size = 268435456;
+    """)
     return conn
 
 
+_ATTENDANCE_RECORDS_DDL = """
+    CREATE TABLE IF NOT EXISTS {table} (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        date TEXT NOT NULL,
+        student_id INTEGER NOT NULL,
+        status TEXT NOT NULL,
+        FOREIGN KEY (student_id) REFERENCES students(id) ON DELETE CASCADE
+    );
+"""
+
+
+def migrate_attendance_cascade(conn):
+    """
+    Rebuild attendance_records with ON DELETE CASCADE if it was created without it.
+    SQLite cannot alter a foreign key clause, so the table is copied and swapped.
+    """
+    fks = conn.execute('PRAGMA foreign_key_list(attendance_records)').fetchall()
+    if all(fk['on_delete'] == 'CASCADE' for fk in fks):
+        return
+    # The view is dropped first so the rename does not trip over its reference
+    conn.executescript("BEGIN;" + _ATTENDANCE_RECORDS_DDL.format(table='attendance_records_new') + """
+        DROP VIEW IF EXISTS student_stats;
+        INSERT INTO attendance_records_new (id, date, student_id, status)
+            SELECT id, date, student_id, status FROM attendance_records
+            WHERE student_id IN (SELECT id FROM students);
+        DROP TABLE attendance_records;
+        ALTER TABLE attendance_records_new RENAME TO attendance_records;
+        COMMIT;
+    """)
+
+
+def migrate_legacy_totals(conn):
+    """
+    Drop the total_attendance/total_classes counters left over from before totals
+    were derived from attendance_records. Needs SQLite 3.35+ for DROP COLUMN; on
+    older versions the columns are left in place, unused.
+    """
+    if sqlite3.sqlite_version_info < (3, 35, 0):
+        return
+    columns = {c['name'] for c in conn.execute('PRAGMA table_info(students)')}
+    for column in ('total_attendance', 'total_classes'):
+        if column in columns:
+            conn.execute(f'ALTER TABLE students DROP COLUMN {column}')
+
+
+_SCHEMA = """
+    CREATE TABLE IF NOT EXISTS students (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        roll_no TEXT UNIQUE NOT NULL,
+        name TEXT NOT NULL,
+        semester INTEGER NOT NULL,
+        marks REAL DEFAULT 0
+    );
+""" + _ATTENDANCE_RECORDS_DDL.format(table='attendance_records') + """
+    DROP INDEX IF EXISTS idx_attendance_student;
+    DROP INDEX IF EXISTS idx_attendance_date;
+    CREATE INDEX IF NOT EXISTS idx_ar_date_student
+        ON attendance_records(date, student_id, status);
+    CREATE INDEX IF NOT EXISTS idx_ar_student_date
+        ON attendance_records(student_id, date, status);
+    CREATE VIEW IF NOT EXISTS student_stats AS
+        SELECT s.*,
+               COALESCE(a.present, 0) AS present_count,
+               COALESCE(a.total, 0) AS class_count
+        FROM students s
+        LEFT JOIN (
+            SELECT student_id, SUM(status = 'present') AS present, COUNT(*) AS total
+            FROM attendance_records GROUP BY student_id
+        ) a ON a.student_id = s.id;
+"""
+
+
+def create_schema(conn):
+    """Create the full schema, upgrading databases made before versioning."""
+    # journal_mode is stored in the database file and cannot change inside a transaction
+    conn.execute('PRAGMA journal_mode = WAL')
+    migrate_attendance_cascade(conn)
+    conn.executescript(_SCHEMA)
+
+
+# MIGRATIONS[n] upgrades a database from user_version n to n + 1
+MIGRATIONS = (create_schema, migrate_legacy_totals)
+
+
 def init_db():
-    """Initialize database tables."""
+    """Initialize database tables, applying any schema migrations not yet run."""
     conn = get_db()
-    conn.executescript("""
-        CREATE TABLE IF NOT EXISTS students (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            roll_no TEXT UNIQUE NOT NULL,
-            name TEXT NOT NULL,
-            semester INTEGER NOT NULL,
-            marks REAL DEFAULT 0,
-            total_attendance INTEGER DEFAULT 0,
-            total_classes INTEGER DEFAULT 0
-        );
-        CREATE TABLE IF NOT EXISTS attendance_records (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            date TEXT NOT NULL,
-            student_id INTEGER NOT NULL,
-            status TEXT NOT NULL,
-            FOREIGN KEY (student_id) REFERENCES students(id)
-        );
-    """)
-    conn.commit()
+    version = conn.execute('PRAGMA user_version').fetchone()[0]
+    for target, migrate in enumerate(MIGRATIONS[version:], start=version + 1):
+        migrate(conn)
+        conn.execute(f'PRAGMA user_version = {target}')
+        conn.commit()
     conn.close()
 
 
+@app.before_request
+def open_db():
+    """Open one database connection shared by the whole request."""
+    g.db = get_db()
+
+
+@app.teardown_request
+def close_db(exc):
+    """Close the request's database connection."""
+    # A streamed response still needs the connection; its generator clears the flag when done
+    if g.get('streaming'):
+        return
+    db = g.pop('db', None)
+    if db is not None:
+        db.close()
+
+
+def stream_page(template_name, **context):
+    """Render a template as a streamed response, keeping the DB connection open until done."""
+    # Pop flashes into the request now, while the session can still be saved
+    get_flashed_messages()
+    app.update_template_context(context)
+    stream = app.jinja_env.get_template(template_name).stream(context)
+    stream.enable_buffering(5)
+    g.streaming = True
+
+    def generate():
+        try:
+            yield from stream
+        finally:
+            g.streaming = False
+
+    return Response(stream_with_context(generate()), mimetype='text/html')
+
+
+def get_students():
+    """Return all students ordered by roll number, queried at most once per request."""
+    if 'students' not in g:
+        g.students = g.db.execute(_STUDENTS_SQL).fetchall()
+    return g.students
+
+
+def get_attendance_totals(conn):
+    """Return {student_id: (present, total)} aggregated from attendance records."""
+    rows = conn.execute(
+        "SELECT student_id, SUM(status = 'present'), COUNT(*) "
+        'FROM attendance_records GROUP BY student_id'
+    ).fetchall()
+    return {r[0]: (r[1], r[2]) for r in rows}
+
+
 # ============== AI-ASSISTED VALIDATION ==============
 def validate_roll_number(roll_no):
     """
     AI-inspired validation: Roll number should be alphanumeric,
     3-15 chars, optionally with dashes (e.g., CS101, 2024-CS-001).
     """
-    pattern = r'^[A-Za-z0-9\-]{3,15}$'
     if not roll_no or not roll_no.strip():
         return False, "Roll number cannot be empty."
-    if not re.match(pattern, roll_no.strip()):
+    if not _ROLL_RE.match(roll_no.strip()):
         return False, "Roll number must be 3-15 alphanumeric characters (hyphens allowed)."
     return True, "Valid roll number."
 
 
+def validate_attendance_date(date_str):
+    """
+    Attendance can be marked for today or past dates, never on a Sunday.
+    Returns (True, date) when valid, otherwise (False, error message).
+    """
+    try:
+        day = date.fromisoformat(date_str)
+    except ValueError:
+        return False, "Invalid date."
+    if day > date.today():
+        return False, "Cannot mark attendance for future dates."
+    if day.weekday() == 6:  # Sunday = 6
+        return False, "Attendance cannot be marked for Sunday."
+    return True, day
+
+
 def get_attendance_remark(percentage):
     """
     AI-inspired: Suggest attendance shortage warning (below 75%).
     """
-    if percentage >= 90:
-        return "Excellent", "success"
-    elif percentage >= 75:
-        return "Good - Meets requirement", "info"
-    elif percentage >= 60:
-        return "Warning: Below 75% - May affect eligibility", "warning"
-    else:
-        return "Critical: Below 60% - Immediate attention needed", "danger"
+    return _ATT_BY_SCORE[min(max(int(percentage), 0), 100)]
 
 
 def get_performance_remark(marks):
     """
     AI-inspired: Provide simple performance remarks.
     """
-    if marks >= 90:
-        return "Excellent"
-    elif marks >= 80:
-        return "Very Good"
-    elif marks >= 70:
-        return "Good"
-    elif marks >= 60:
-        return "Average"
-    elif marks >= 40:
-        return "Needs Improvement"
-    else:
-        return "Poor - Requires Support"
+    return _PERF_BY_SCORE[min(max(int(marks), 0), 100)]
 
 
 def generate_sample_students(count=5):
     """
     AI-assisted: Auto-generate sample student data.
     """
-    students = []
-    used_rolls = set()
-    for i in range(count):
-        roll_no = f"CS{fake.random_int(1000, 9999)}"
-        while roll_no in used_rolls:
-            roll_no = f"CS{fake.random_int(1000, 9999)}"
-        used_rolls.add(roll_no)
-        students.append({
-            'roll_no': roll_no,
+    # Sampling without replacement gives unique roll numbers up front
+    suffixes = random.sample(range(1000, 10000), count)
+    return [
+        {
+            'roll_no': f"CS{n}",
             'name': fake.name(),
-            'semester': fake.random_int(1, 8)
-        })
-    return students
+            'semester': random.randint(1, 8)
+        }
+        for n in suffixes
+    ]
 
 
 # ============== ROUTES ==============
@@ -120,17 +287,15 @@ def generate_sample_students(count=5):
 @app.route('/')
 def index():
     """Home page with dashboard overview."""
-    conn = get_db()
-    students = conn.execute('SELECT * FROM students ORDER BY roll_no').fetchall()
-    conn.close()
-
+    conn = g.db
+    students = conn.execute('SELECT * FROM student_stats ORDER BY roll_no').fetchall()
     # Calculate summary stats
-    total_students = len(students)
-    low_attendance = 0
-    for s in students:
-        pct = (s['total_attendance'] / s['total_classes'] * 100) if s['total_classes'] > 0 else 0
-        if pct < 75 and s['total_classes'] > 0:
-            low_attendance += 1
+    total_students, low_attendance = conn.execute(
+        'SELECT COUNT(*), '
+        'COALESCE(SUM(CASE WHEN class_count > 0 AND present_count * 100.0 / class_count < 75 '
+        'THEN 1 ELSE 0 END), 0) '
+        'FROM student_stats'
+    ).fetchone()
 
     return render_template('index.html', students=students,
                            total_students=total_students,
@@ -164,33 +329,25 @@ def students():
             flash("Name cannot be empty.", 'error')
             return redirect(url_for('students'))
 
-        conn = get_db()
+        conn = g.db
         try:
-            conn.execute(
-                'INSERT INTO students (roll_no, name, semester) VALUES (?, ?, ?)',
-                (roll_no.upper(), name, semester)
-            )
+            conn.execute(_INSERT_STUDENT_SQL, (roll_no.upper(), name, semester))
             conn.commit()
             flash(f"Student {roll_no} added successfully!", 'success')
         except sqlite3.IntegrityError:
             flash(f"Roll number {roll_no} already exists.", 'error')
-        conn.close()
         return redirect(url_for('students'))
 
-    conn = get_db()
-    students_list = conn.execute('SELECT * FROM students ORDER BY roll_no').fetchall()
-    conn.close()
+    students_list = get_students()
     return render_template('students.html', students=students_list)
 
 
 @app.route('/students/delete/<int:student_id>', methods=['POST'])
 def delete_student(student_id):
     """Delete a student."""
-    conn = get_db()
-    conn.execute('DELETE FROM attendance_records WHERE student_id = ?', (student_id,))
-    conn.execute('DELETE FROM students WHERE id = ?', (student_id,))
-    conn.commit()
-    conn.close()
+    # attendance_records rows go with it via ON DELETE CASCADE
+    g.db.execute('DELETE FROM students WHERE id = ?', (student_id,))
+    g.db.commit()
     flash("Student deleted.", 'success')
     return redirect(url_for('students'))
 
@@ -198,101 +355,58 @@ def delete_student(student_id):
 @app.route('/attendance', methods=['GET', 'POST'])
 def attendance():
     """Mark and view attendance."""
-    conn = get_db()
-    students_list = conn.execute('SELECT * FROM students ORDER BY roll_no').fetchall()
-    conn.close()
+    conn = g.db
+    students_list = get_students()
 
     if request.method == 'POST':
-        today_str = datetime.now().strftime('%Y-%m-%d')
-        date_str = request.form.get('date', today_str)
-
-        # Validation: No future dates (allow today and past only)
-        if date_str > today_str:
-            flash("Cannot mark attendance for future dates.", 'error')
+        date_str = request.form.get('date', date.today().isoformat())
+        valid, result = validate_attendance_date(date_str)
+        if not valid:
+            flash(result, 'error')
             return redirect(url_for('attendance'))
+        date_str = result.isoformat()
 
-        # Validation: No attendance on Sunday
-        try:
-            dt = datetime.strptime(date_str, '%Y-%m-%d')
-            if dt.weekday() == 6:  # Sunday = 6
-                flash("Attendance cannot be marked for Sunday.", 'error')
-                return redirect(url_for('attendance'))
-        except ValueError:
-            pass
+        records = [
+            (date_str, s['id'], request.form.get(f'status_{s["id"]}', 'absent'))
+            for s in students_list
+        ]
 
-        conn = get_db()
-        # If attendance already exists, revert totals before updating (edit mode)
-        existing_records = conn.execute(
-            'SELECT student_id, status FROM attendance_records WHERE date = ?', (date_str,)
-        ).fetchall()
-        if existing_records:
-            for r in existing_records:
-                conn.execute(
-                    'UPDATE students SET total_classes = total_classes - 1 WHERE id = ?',
-                    (r['student_id'],)
-                )
-                if r['status'] == 'present':
-                    conn.execute(
-                        'UPDATE students SET total_attendance = total_attendance - 1 WHERE id = ?',
-                        (r['student_id'],)
-                    )
+        # Single transaction: one commit for the whole submission
+        with conn:
+            # Edit mode: replace any records already saved for this date
             conn.execute('DELETE FROM attendance_records WHERE date = ?', (date_str,))
-
-        for student in students_list:
-            status = request.form.get(f'status_{student["id"]}', 'absent')
-            conn.execute(
-                'INSERT INTO attendance_records (date, student_id, status) VALUES (?, ?, ?)',
-                (date_str, student['id'], status)
-            )
-            if status == 'present':
-                conn.execute(
-                    'UPDATE students SET total_attendance = total_attendance + 1 WHERE id = ?',
-                    (student['id'],)
-                )
-            conn.execute(
-                'UPDATE students SET total_classes = total_classes + 1 WHERE id = ?',
-                (student['id'],)
-            )
-        conn.commit()
-        conn.close()
+            conn.executemany(_INSERT_ATTENDANCE_SQL, records)
         flash(f"Attendance saved for {date_str}.", 'success')
         return redirect(url_for('attendance'))
 
     # Build student list with attendance % and AI remarks
+    totals = get_attendance_totals(conn)
     students_with_pct = []
     for s in students_list:
-        pct = (s['total_attendance'] / s['total_classes'] * 100) if s['total_classes'] > 0 else 0
+        present, total = totals.get(s['id'], (0, 0))
+        pct = (present / total * 100) if total > 0 else 0
         remark, remark_class = get_attendance_remark(pct)
-        students_with_pct.append({
-            **dict(s),
-            'attendance_pct': round(pct, 1),
-            'attendance_remark': remark,
-            'remark_class': remark_class
-        })
+        students_with_pct.append(AttendanceRow(
+            s['id'], s['roll_no'], s['name'], round(pct, 1), remark, remark_class
+        ))
 
-    today = datetime.now().strftime('%Y-%m-%d')
+    today = date.today().isoformat()
     selected_date = request.args.get('date', today)
     if selected_date > today:
         selected_date = today
-    conn = get_db()
-    attendance_taken_for_date = conn.execute(
-        'SELECT COUNT(*) FROM attendance_records WHERE date = ?', (selected_date,)
-    ).fetchone()[0] > 0
-    # Fetch existing attendance for edit mode (pre-fill form)
-    existing_attendance = {}
-    if attendance_taken_for_date:
-        records = conn.execute(
-            'SELECT student_id, status FROM attendance_records WHERE date = ?',
-            (selected_date,)
-        ).fetchall()
-        existing_attendance = {r['student_id']: r['status'] for r in records}
+    # Existing attendance pre-fills the form in edit mode; any row means it was taken
+    records = conn.execute(
+        'SELECT student_id, status FROM attendance_records WHERE date = ?',
+        (selected_date,)
+    ).fetchall()
+    existing_attendance = {r['student_id']: r['status'] for r in records}
+    attendance_taken_for_date = bool(existing_attendance)
     edit_mode = bool(request.args.get('edit')) and attendance_taken_for_date
     # Check if selected date is Sunday
     try:
-        is_sunday = datetime.strptime(selected_date, '%Y-%m-%d').weekday() == 6
+        is_sunday = date.fromisoformat(selected_date).weekday() == 6
     except ValueError:
         is_sunday = False
-    conn.close()
     return render_template('attendance.html', students=students_with_pct, today=today,
                            selected_date=selected_date,
                            attendance_taken_for_date=attendance_taken_for_date,
@@ -304,12 +418,10 @@ def attendance():
 @app.route('/marks', methods=['GET', 'POST'])
 def marks():
     """Enter and view marks."""
-    conn = get_db()
-    students_list = conn.execute('SELECT * FROM students ORDER BY roll_no').fetchall()
-    conn.close()
+    students_list = get_students()
 
     if request.method == 'POST':
-        conn = get_db()
+        updates = []
         for student in students_list:
             mark_str = request.form.get(f'marks_{student["id"]}', '0')
             try:
@@ -317,9 +429,12 @@ def marks():
                 marks_val = max(0, min(100, marks_val))
             except ValueError:
                 marks_val = 0
-            conn.execute('UPDATE students SET marks = ? WHERE id = ?', (marks_val, student['id']))
-        conn.commit()
-        conn.close()
+            # Only write rows whose marks actually changed
+            if marks_val != student['marks']:
+                updates.append((marks_val, student['id']))
+        if updates:
+            with g.db:
+                g.db.executemany('UPDATE students SET marks = ? WHERE id = ?', updates)
         flash("Marks updated.", 'success')
         return redirect(url_for('marks'))
 
@@ -329,7 +444,7 @@ def marks():
     students_with_remarks = []
     for s in students_list:
         remark = get_performance_remark(s['marks'])
-        students_with_remarks.append({**dict(s), 'remark': remark})
+        students_with_remarks.append(MarksRow(s['id'], s['roll_no'], s['name'], s['marks'], remark))
 
     return render_template('marks.html', students=students_with_remarks, avg_marks=avg_marks)
 
@@ -337,29 +452,36 @@ def marks():
 @app.route('/reports/overall')
 def overall_report():
     """Overall report - student-wise summary."""
-    conn = get_db()
-    students_list = conn.execute('SELECT * FROM students ORDER BY roll_no').fetchall()
-    conn.close()
-
-    report_rows = []
-    for s in students_list:
-        att_pct = (s['total_attendance'] / s['total_classes'] * 100) if s['total_classes'] > 0 else 0
-        att_remark, att_class = get_attendance_remark(att_pct)
-        perf_remark = get_performance_remark(s['marks'])
-        report_rows.append({
-            'roll_no': s['roll_no'],
-            'name': s['name'],
-            'semester': s['semester'],
-            'total_attendance': s['total_attendance'],
-            'total_classes': s['total_classes'],
-            'attendance_pct': round(att_pct, 1),
-            'attendance_remark': att_remark,
-            'remark_class': att_class,
-            'marks': s['marks'],
-            'performance_remark': perf_remark,
-        })
-
-    return render_template('overall_report.html', students=report_rows)
+    cursor = g.db.execute(
+        'SELECT roll_no, name, semester, marks, present_count, class_count, '
+        'CASE WHEN class_count > 0 THEN present_count * 100.0 / class_count ELSE 0 END '
+        'AS attendance_pct '
+        'FROM student_stats ORDER BY roll_no'
+    )
+    first = cursor.fetchone()
+
+    # Rows are built lazily while the template streams
+    def report_rows():
+        if first is None:
+            return
+        for s in chain((first,), cursor):
+            att_remark, att_class = get_attendance_remark(s['attendance_pct'])
+            perf_remark = get_performance_remark(s['marks'])
+            yield {
+                'roll_no': s['roll_no'],
+                'name': s['name'],
+                'semester': s['semester'],
+                'total_attendance': s['present_count'],
+                'total_classes': s['class_count'],
+                'attendance_pct': round(s['attendance_pct'], 1),
+                'attendance_remark': att_remark,
+                'remark_class': att_class,
+                'marks': s['marks'],
+                'performance_remark': perf_remark,
+            }
+
+    return stream_page('overall_report.html', students=report_rows(),
+                       has_students=first is not None)
 
 
 @app.route('/attendance/report')
@@ -379,35 +501,44 @@ def attendance_report():
         year, month = today.year, today.month
 
     _, num_days = calendar.monthrange(year, month)
-    dates_in_month = [date(year, month, d).strftime('%Y-%m-%d') for d in range(1, num_days + 1)]
-
-    conn = get_db()
-    students_list = conn.execute('SELECT * FROM students ORDER BY roll_no').fetchall()
-    # Build {date: {student_id: status}}
-    records = conn.execute(
-        'SELECT date, student_id, status FROM attendance_records WHERE date >= ? AND date <= ?',
+    dates_in_month = [f'{year:04d}-{month:02d}-{d:02d}' for d in range(1, num_days + 1)]
+
+    # One row per (student, marked date); students with nothing marked get a single NULL row
+    rows = g.db.execute(
+        'SELECT s.id, s.roll_no, s.name, ar.date, ar.status '
+        'FROM students s '
+        'LEFT JOIN attendance_records ar '
+        'ON ar.student_id = s.id AND ar.date BETWEEN ? AND ? '
+        'ORDER BY s.roll_no, ar.date',
         (dates_in_month[0], dates_in_month[-1])
     ).fetchall()
-    conn.close()
-
-    # attendance_map[date][student_id] = 'present' | 'absent'
-    attendance_map = {d: {} for d in dates_in_month}
-    for r in records:
-        attendance_map[r['date']][r['student_id']] = r['status']
 
-    # Monthly percentage per student: {student_id: (present, total)}
-    monthly_pct = {}
-    for s in students_list:
-        sid = s['id']
-        present = sum(1 for d in dates_in_month if attendance_map[d].get(sid) == 'present')
-        total = sum(1 for d in dates_in_month if attendance_map[d].get(sid) in ('present', 'absent'))
-        monthly_pct[sid] = (present, total)
+    # report_rows: per student, statuses[i] is 'present' | 'absent' | None for dates_in_month[i]
+    day_index = {d: i for i, d in enumerate(dates_in_month)}
+    report_rows = []
+    for _, group in groupby(rows, key=itemgetter('id')):
+        statuses = [None] * num_days
+        present = total = 0
+        for r in group:
+            if r['date'] is None:
+                continue
+            status = r['status']
+            statuses[day_index[r['date']]] = status
+            if status in ('present', 'absent'):
+                total += 1
+                if status == 'present':
+                    present += 1
+        report_rows.append({
+            'roll_no': r['roll_no'],
+            'name': r['name'],
+            'statuses': statuses,
+            'present': present,
+            'total': total,
+        })
 
     return render_template('attendance_report.html',
-                           students=students_list,
+                           students=report_rows,
                            dates=dates_in_month,
-                           attendance_map=attendance_map,
-                           monthly_pct=monthly_pct,
                            year=year, month=month,
                            month_name=datetime(year, month, 1).strftime('%B %Y'))
 
@@ -422,30 +553,46 @@ def ai_generate_sample():
         count = 5
 
     sample = generate_sample_students(count)
-    conn = get_db()
+    conn = g.db
     added = 0
     for s in sample:
         try:
-            conn.execute(
-                'INSERT INTO students (roll_no, name, semester) VALUES (?, ?, ?)',
-                (s['roll_no'], s['name'], s['semester'])
-            )
+            conn.execute(_INSERT_STUDENT_SQL, (s['roll_no'], s['name'], s['semester']))
             added += 1
         except sqlite3.IntegrityError:
             pass
     conn.commit()
-    conn.close()
     flash(f"Generated and added {added} sample student(s).", 'success')
     return redirect(url_for('students'))
 
 
+_encode_json = json.JSONEncoder(separators=(',', ':')).encode
+
+
+def roll_validation_json(roll_no):
+    """Encode the validate_roll_number result for the API."""
+    valid, msg = validate_roll_number(roll_no)
+    return _encode_json({'valid': valid, 'message': msg})
+
+
+# Canned bodies for rejections decided by length alone
+_EMPTY_ROLL_JSON = roll_validation_json('')
+_BAD_LENGTH_ROLL_JSON = roll_validation_json('x' * 16)
+
+
 @app.route('/api/validate-roll', methods=['POST'])
 def api_validate_roll():
     """API endpoint for roll number validation."""
     data = request.get_json() or {}
     roll_no = data.get('roll_no', '')
-    valid, msg = validate_roll_number(roll_no)
-    return jsonify({'valid': valid, 'message': msg})
+    stripped = roll_no.strip() if roll_no else ''
+    if not stripped:
+        body = _EMPTY_ROLL_JSON
+    elif not 3 <= len(stripped) <= 15:
+        body = _BAD_LENGTH_ROLL_JSON
+    else:
+        body = roll_validation_json(stripped)
+    return Response(body, mimetype='application/json')
 
 
 if __name__ == '__main__':